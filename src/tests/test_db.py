@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#############################################################################
+#
+# VoiceID, Copyright (C) 2011-2012, Sardegna Ricerche.
+# Email: labcontdigit@sardegnaricerche.it, michela.fancello@crs4.it, 
+#        mauro.mereu@crs4.it
+# Web: http://code.google.com/p/voiceid
+# Authors: Michela Fancello, Mauro Mereu
+#
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#############################################################################
+
+
+from voiceid import db
+import shutil
+import tempfile
+import threading
+import unittest
+
+
+class VoicesLookupTest(unittest.TestCase):
+    """voiceid.db.GMMVoiceDB.voices_lookup tests"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _lookup(self, thrd_n, wave_dictionary):
+        voicedb = db.GMMVoiceDB(self.tmp_dir, thrd_n)
+
+        def _match_voices(wave_files, gender):
+            self.lock.acquire()
+            self.calls.append((gender, sorted(wave_files)))
+            self.lock.release()
+            return dict((wave_file, {gender: -1.0})
+                        for wave_file in wave_files)
+        voicedb.match_voices = _match_voices
+        return voicedb.voices_lookup(wave_dictionary)
+
+    def test_voices_lookup_batches(self):
+        waves = dict(('M%d.wav' % i, 'M') for i in range(5))
+        waves['F0.wav'] = 'F'
+        res = self._lookup(2, waves)
+        self.assertEqual(sorted(res), sorted(waves))
+        self.assertEqual(sorted(gender for gender, _ in self.calls),
+                         ['F', 'M', 'M'])
+        self.assertEqual(sorted(len(batch) for _, batch in self.calls),
+                         [1, 2, 3])
+        self.assertEqual(sorted(sum((batch for _, batch in self.calls), [])),
+                         sorted(waves))
+
+    def test_voices_lookup_single_thread(self):
+        waves = dict(('M%d.wav' % i, 'M') for i in range(3))
+        self._lookup(1, waves)
+        self.assertEqual(self.calls,
+                         [('M', ['M0.wav', 'M1.wav', 'M2.wav'])])
+
+if __name__ == "__main__":
+    suite = unittest.TestLoader().loadTestsFromTestCase(VoicesLookupTest)
+    unittest.TextTestRunner(verbosity=2).run(suite)
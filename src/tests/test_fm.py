@@ -22,11 +22,12 @@
 from tests import TEMP_DIR, TEST_DIR, TEST_WAV, TEST_NAME, TEST_GMM, \
     TWO_SPKRS_WAV, TWO_SPKRS_SEG, TWO_SPKRS_SEG_ST, TEST_WAV_B, \
     DB_DIR, TEST_WAV_ID_SEG
-from voiceid import fm
+from voiceid import fm, utils
 import filecmp
 import os
 import shutil
 import unittest
+import wave
 
 
 def setUpModule():
@@ -64,6 +65,19 @@ def compare_seg(seg_1, seg_2, headers=False):
 class FMTest(unittest.TestCase):
     """voiceid.fm tests"""
 
+    def setUp(self):
+        self._stubs = []
+
+    def tearDown(self):
+        for obj, name, value in reversed(self._stubs):
+            setattr(obj, name, value)
+
+    def _stub(self, obj, name, value):
+        """Replace an attribute for the current test only, it is restored
+        by tearDown even if the test fails"""
+        self._stubs.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
     def test_build_gmm(self):
         newname = TEST_WAV.replace('_', '')
         shutil.copy(TEST_WAV, newname)
@@ -81,6 +95,48 @@ class FMTest(unittest.TestCase):
         fm.diarization_standard(filebasename)
         self.assertTrue(compare_seg(filebasename + '.seg', TWO_SPKRS_SEG_ST))
 
+    def test_file2wav_converted(self):
+        filename = os.path.join(TEMP_DIR, 'converted.ogg')
+        wavename = os.path.join(TEMP_DIR, 'converted.wav')
+        open(filename, 'w').close()
+        calls = []
+
+        def _convert(args):
+            calls.append(args)
+            shutil.copy(TEST_WAV, args[-1][len('location='):])
+
+        self._stub(fm.utils, 'start_subprocess', _convert)
+        self.assertEqual(fm.file2wav(filename), filename)
+        self.assertEqual(len(calls), 1)
+        # the same input, converted just once
+        fm.file2wav(filename)
+        self.assertEqual(len(calls), 1)
+        # an empty wave, like the one left by a failed conversion
+        w_out = wave.open(wavename, 'wb')
+        w_out.setparams((1, 2, 16000, 0, 'NONE', 'not compressed'))
+        w_out.close()
+        fm.file2wav(filename)
+        self.assertEqual(len(calls), 2)
+        # an empty and a truncated file, left by an interrupted conversion
+        for data in ('', open(TEST_WAV, 'rb').read(30)):
+            w_out = open(wavename, 'wb')
+            w_out.write(data)
+            w_out.close()
+            fm.file2wav(filename)
+        self.assertEqual(len(calls), 4)
+        # an input replaced by an older file, i.e. restored by "cp -p"
+        open(filename, 'w').close()
+        os.utime(filename, (0, 0))
+        fm.file2wav(filename)
+        self.assertEqual(len(calls), 5)
+        # a wave left without the stamp of its input
+        os.remove(wavename + '.src')
+        fm.file2wav(filename)
+        self.assertEqual(len(calls), 6)
+        self.assertFalse(os.path.exists(wavename + '.part'))
+        self.assertEqual(wave.open(wavename).getnframes(),
+                         wave.open(TEST_WAV).getnframes())
+
     def test_get_gender(self):
         self.assertEqual(fm.get_gender(TEST_GMM), 'M')
 
@@ -92,6 +148,136 @@ class FMTest(unittest.TestCase):
                     wav_filename + '.ident.M.' + gmm_file + '.seg')
         self.assertTrue(compare_seg(ident_seg, TEST_WAV_ID_SEG, True))
 
+    def test_lium_embedded_jvm(self):
+        calls = []
+        self._stub(fm.utils, 'start_subprocess', calls.append)
+        self._stub(fm.CONFIGURATION, 'EMBEDDED_JVM', True)
+        self._stub(fm.utils, 'start_jvm_main',
+                   lambda main_class, args, memory: True)
+        fm._lium('fr.lium.spkDiarization.programs.MScore', ['--help'])
+        self.assertEqual(calls, [])
+        fm.utils.start_jvm_main = lambda main_class, args, memory: False
+        fm._lium('fr.lium.spkDiarization.programs.MScore', ['--help'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][-2:],
+                         ['fr.lium.spkDiarization.programs.MScore', '--help'])
+
+    def test_merge_waves(self):
+        merged = os.path.join(TEMP_DIR, 'merged.wav')
+        fm.merge_waves([TEST_WAV, TWO_SPKRS_WAV], merged)
+        frames = [wave.open(wav).getnframes()
+                  for wav in (TEST_WAV, TWO_SPKRS_WAV, merged)]
+        self.assertEqual(frames[2], frames[0] + frames[1])
+        self.assertTrue(utils.is_good_wave(merged))
+
+    def test_merge_waves_extensible(self):
+        extensible = os.path.join(TEMP_DIR, 'extensible.wav')
+        data = open(TEST_WAV, 'rb').read()
+        # WAVE_FORMAT_EXTENSIBLE format tag, not read by the wave module
+        w_out = open(extensible, 'wb')
+        w_out.write(data[:20] + '\xfe\xff' + data[22:])
+        w_out.close()
+        merged = os.path.join(TEMP_DIR, 'merged_ext.wav')
+        calls = []
+        self._stub(fm.utils, 'start_subprocess', calls.append)
+        fm.merge_waves([TEST_WAV, extensible], merged)
+        self.assertEqual(calls, [['sox', TEST_WAV, extensible, merged]])
+
+    def test_merge_waves_truncated(self):
+        truncated = os.path.join(TEMP_DIR, 'truncated.wav')
+        w_out = open(truncated, 'wb')
+        w_out.write(open(TEST_WAV, 'rb').read(30))
+        w_out.close()
+        merged = os.path.join(TEMP_DIR, 'merged_trunc.wav')
+        calls = []
+        self._stub(fm.utils, 'start_subprocess', calls.append)
+        fm.merge_waves([TEST_WAV, truncated], merged)
+        self.assertEqual(calls, [['sox', TEST_WAV, truncated, merged]])
+
+    def test_seg2trim(self):
+        filebasename = os.path.splitext(TWO_SPKRS_WAV)[0]
+        shutil.copy(TWO_SPKRS_SEG, filebasename + '.seg')
+        fm.seg2trim(filebasename)
+        trimmed = os.listdir(os.path.join(filebasename, 'S21'))
+        self.assertEqual(len(trimmed), 3)
+        for wav in trimmed:
+            duration = int(os.path.splitext(wav)[0].split('.')[-1])
+            self.assertEqual(fm.wave_duration(
+                    os.path.join(filebasename, 'S21', wav)), duration)
+
+    def test_seg2srt(self):
+        fm.seg2srt(TWO_SPKRS_SEG)
+        srt = open(os.path.splitext(TWO_SPKRS_SEG)[0] + '.srt')
+        blocks = srt.read().split('\n\n')
+        srt.close()
+        self.assertEqual(len(blocks), 23)
+        self.assertEqual(blocks[1], '2\n00:00:09,440 --> 00:00:20,920\nS0')
+
+    def test_waves_vs_gmm(self):
+        basename = os.path.join(TEMP_DIR, 'voices')
+        waves = []
+        for idx, label in enumerate(['S0', 'S10']):
+            waves.append(os.path.join(TEMP_DIR, 'cluster%d.wav' % idx))
+            seg = open(os.path.splitext(waves[-1])[0] + '.seg', 'w')
+            seg.write(";; cluster:%s [ score:FS = -33.9 ]\n"
+                      "%s 1 0 120 M S U %s\n"
+                      % (label, os.path.splitext(waves[-1])[0], label))
+            seg.close()
+        calls = []
+
+        def _lium(program, arguments, memory=fm.JAVA_MEM):
+            calls.append(arguments)
+            shutil.copy(basename + '.seg', basename + '.ident.M.M.gmm.seg')
+
+        self._stub(fm, '_lium', _lium)
+        labels, scores = fm.waves_vs_gmm(basename, waves,
+                                         os.path.join(TEMP_DIR, 'M.gmm'), 'M')
+        self.assertEqual(labels, ['W0', 'W1'])
+        self.assertEqual(scores, None)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][-1], basename)
+        seg = open(basename + '.seg')
+        lines = seg.read().splitlines()
+        seg.close()
+        self.assertEqual(lines, [
+            ';; cluster:W0 [ score:FS = -33.9 ]',
+            os.path.splitext(waves[0])[0] + ' 1 0 120 M S U W0',
+            ';; cluster:W1 [ score:FS = -33.9 ]',
+            os.path.splitext(waves[1])[0] + ' 1 0 120 M S U W1'])
+
+    def test_ident_seg_rename(self):
+        basename = os.path.join(TEMP_DIR, 'S1', 'show')
+        os.makedirs(os.path.dirname(basename))
+        seg = open(basename + '.seg', 'w')
+        seg.write(";; cluster:S1 [ score:FS = -33.9 ]\n"
+                  "%s 1 0 120 M S U S1\n"
+                  ";; cluster:S10 [ score:FS = -34.1 ]\n"
+                  "%s 1 120 80 M S U S10\n" % (basename, basename))
+        seg.close()
+        fm.ident_seg_rename(basename, 'anna', basename + '.ident')
+        seg = open(basename + '.ident.seg')
+        self.assertEqual(seg.read(),
+                         ";; cluster:anna [ score:FS = -33.9 ]\n"
+                         "%s 1 0 120 M S U anna\n"
+                         ";; cluster:anna [ score:FS = -34.1 ]\n"
+                         "%s 1 120 80 M S U anna\n" % (basename, basename))
+        seg.close()
+
+    def test_srt2subnames(self):
+        basename = os.path.join(TEMP_DIR, 'subnames')
+        srt = open(basename + '.srt', 'w')
+        srt.write("1\n00:00:00,000 --> 00:00:01,000\nS1\n\n"
+                  "2\n00:00:01,000 --> 00:00:02,000\nS10\n\n"
+                  "3\n00:00:02,000 --> 00:00:03,000\nS1 S10\n\n")
+        srt.close()
+        fm.srt2subnames(basename, {'S1': 'anna', 'S10': 'luca'})
+        srt = open(basename + '.ident.srt')
+        self.assertEqual(srt.read(),
+                         "1\n00:00:00,000 --> 00:00:01,000\nanna\n\n"
+                         "2\n00:00:01,000 --> 00:00:02,000\nluca\n\n"
+                         "3\n00:00:02,000 --> 00:00:03,000\nS1 S10\n\n")
+        srt.close()
+
     def test_wave_duration(self):
         self.assertEqual(fm.wave_duration(TEST_WAV), 43)
 
@@ -19,7 +19,11 @@
 #
 #############################################################################
 
+from tests import TEST_DIR
 from voiceid import sr
+import os
+import shutil
+import tempfile
 import unittest
 
 
@@ -61,4 +65,85 @@ class ClusterTest(unittest.TestCase):
         c = sr.Cluster("ciccio", "M", 1000, "ffa", "S4")
         c.add_segment(sr.Segment("/home/mauro/dev/Lium-8.4/Intervista_a_Giuseppe_Tornatore 1 0 1657 M S U S0".split()))
         c.add_segment(sr.Segment("/home/mauro/dev/Lium-8.4/Intervista_a_Giuseppe_Tornatore 1 1657 2560  M S U S0".split()))
-        
\ No newline at end of file
+
+    def test_best_speaker(self):
+        c = sr.Cluster("unknown", "M", 1000, "ffa", "S0")
+        self.assertEqual(c.get_best_speaker(), 'unknown')
+        self.assertEqual(c.get_distance(), -1)
+        c.add_speaker('anna', -31.2)
+        c.add_speaker('luca', -32.8)
+        c.add_speaker('anna', -33.0)
+        c.add_speaker('gino', -34.0)
+        self.assertEqual(c.get_best_speaker(), 'anna')
+        self.assertEqual(c.value, -31.2)
+        self.assertAlmostEqual(c.get_distance(), 1.6)
+        c.add_speaker('luca', -31.25)
+        self.assertEqual(c.get_best_speaker(), 'unknown')
+
+
+class ManageIdentTest(unittest.TestCase):
+    """voiceid.sr.manage_ident tests"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.basename = os.path.join(self.tmp_dir, 'voices')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_ident_seg(self, gmm, content):
+        seg = open("%s.ident.%s.seg" % (self.basename, gmm), 'w')
+        seg.write(content)
+        seg.close()
+
+    def test_manage_ident_many_models(self):
+        self._write_ident_seg('M.M.gmm',
+            ";; cluster:W0_anna [ score:UBM = -33.2 ] [ score:lenght = 4304 ]"
+            " [ score:anna = -31.8 ] [ score:luca = -32.5 ]\n"
+            "voices 1 0 1139 M S U W0_anna\n"
+            ";; cluster:W1 [ score:UBM = -34.0 ] [ score:lenght = 120 ]"
+            " [ score:anna = -35.1 ] [ score:luca = -34.9 ]\n"
+            "voices 1 0 120 M S U W1\n")
+        clusters = {}
+        sr.manage_ident(self.basename, 'M.M.gmm', clusters)
+        self.assertEqual(sorted(clusters.keys()), ['W0', 'W1'])
+        self.assertEqual(clusters['W0'].speakers,
+                         {'anna': -31.8, 'luca': -32.5})
+        self.assertEqual(clusters['W1'].speakers,
+                         {'anna': -35.1, 'luca': -34.9})
+
+    def test_manage_ident_scores(self):
+        clusters = {}
+        sr.manage_ident(self.basename, 'M.M.gmm', clusters,
+                        {'W0_anna': {'UBM': -33.2, 'anna': -31.8,
+                                     'luca': -32.5}})
+        self.assertEqual(clusters.keys(), ['W0'])
+        self.assertEqual(clusters['W0'].speakers,
+                         {'anna': -31.8, 'luca': -32.5})
+
+
+class ExtractClustersTest(unittest.TestCase):
+    """voiceid.sr.extract_clusters tests"""
+
+    def _extract(self, segname):
+        clusters = {}
+        sr.extract_clusters(os.path.join(TEST_DIR, segname), clusters)
+        return clusters
+
+    def test_extract_clusters_headers(self):
+        clusters = self._extract('twospeakers_test_st.seg')
+        self.assertEqual(len(clusters), 8)
+        self.assertEqual(len(clusters['S0'].get_segments()), 12)
+        self.assertEqual(clusters['S0']._seg_header,
+                         ';; cluster:S0 [ score:FS = -33.87410423026799 ]'
+                         ' [ score:FT = -34.4166051782193 ]'
+                         ' [ score:MS = -33.76958163633703 ]'
+                         ' [ score:MT = -34.34891185440618 ]\n')
+
+    def test_extract_clusters_no_headers(self):
+        clusters = self._extract('twospeakers_test.seg')
+        self.assertEqual(len(clusters), 8)
+        segs = clusters['S21'].get_segments()
+        self.assertEqual(len(segs), 3)
+        self.assertEqual(clusters['S21']._frames,
+                         sum(seg.get_duration() for seg in segs))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#############################################################################
+#
+# VoiceID, Copyright (C) 2011-2012, Sardegna Ricerche.
+# Email: labcontdigit@sardegnaricerche.it, michela.fancello@crs4.it, 
+#        mauro.mereu@crs4.it
+# Web: http://code.google.com/p/voiceid
+# Authors: Michela Fancello, Mauro Mereu
+#
+# This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#############################################################################
+
+
+from voiceid import utils
+import unittest
+
+
+class HumanizeTimeTest(unittest.TestCase):
+    """voiceid.utils.humanize_time tests"""
+
+    def test_humanize_time(self):
+        self.assertEqual(utils.humanize_time(0), '00:00:00,000')
+        self.assertEqual(utils.humanize_time(9.44), '00:00:09,440')
+
+    def test_humanize_time_round_up(self):
+        self.assertEqual(utils.humanize_time(23.99995), '00:00:24,000')
+        self.assertEqual(utils.humanize_time(59.9996), '00:01:00,000')
+
+    def test_humanize_time_hours(self):
+        self.assertEqual(utils.humanize_time(3600), '01:00:00,000')
+        self.assertEqual(utils.humanize_time(16402.99995), '04:33:23,000')
+        self.assertEqual(utils.humanize_time(45296.789), '12:34:56,789')
+
+if __name__ == "__main__":
+    suite = unittest.TestLoader().loadTestsFromTestCase(HumanizeTimeTest)
+    unittest.TextTestRunner(verbosity=2).run(suite)
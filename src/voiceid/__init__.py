@@ -121,6 +121,8 @@ class VConf(object):
         self.QUIET_MODE = False
         self.VERBOSE = False
         self.KEEP_INTERMEDIATE_FILES = False
+        # run the LIUM programs into a JVM embedded via JPype, if installed
+        self.EMBEDDED_JVM = False
         local = 'local'
         if sys.platform == 'win32' or sys.platform == 'darwin':
             local = ''
@@ -145,6 +147,3 @@ class VConf(object):
         self.OUTPUT_FORMAT = 'srt'          # default output format
         #self.test_path = os.path.join(os.path.expanduser('~'),
         #                                '.voiceid', 'test')
-        self.output_redirect = open(os.path.devnull, 'w')
-        if self.VERBOSE:
-            self.output_redirect = open(sys.stdout, 'w')
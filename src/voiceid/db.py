@@ -21,11 +21,12 @@
 from decimal import DivisionByZero
 """Module containing the voice DB relative classes."""
 
-from . import sr, utils, fm
+from . import VConf, sr, utils, fm
 import os
 import shutil
-import threading
-import time
+import tempfile
+
+CONFIGURATION = VConf()
 
 
 class VoiceDB(object):
@@ -143,8 +144,6 @@ class GMMVoiceDB(VoiceDB):
 
     def __init__(self, path, thrd_n=1):
         VoiceDB.__init__(self, path)
-        if not hasattr(self, '__threads'):
-            self.__threads = {}  # class field
         self.__maxthreads = thrd_n
 
     def set_maxthreads(self, trd):
@@ -156,7 +155,8 @@ class GMMVoiceDB(VoiceDB):
             self.__maxthreads = trd
 
     def _read_db(self):
-        """Read for any changes the db voice models files."""
+        """Read for any changes the db voice models files. The listing is
+        kept until the next change, so the lookups don't scan the db."""
         for gen in self._genders:
             dir_ = []
             path = os.path.join(self._path, gen)
@@ -395,6 +395,44 @@ class GMMVoiceDB(VoiceDB):
             spkrs.update(cls[clust].speakers)
         return spkrs
 
+    def match_voices(self, wave_files, gender):
+        """Match the voices (wave files) versus all the gmm models of the
+        given gender in db. All the models are joined in a single gmm file
+        so that just one MScore run scores every wave against every model.
+
+        :type wave_files: list
+        :param wave_files: wave files extracted from the wave
+
+        :type gender: char F, M or U
+        :param gender: the gender of the speakers
+
+        :rtype: dictionary
+        :returns: a dictionary having for every wave file the computed score
+                for every voice model in the db"""
+        res = dict((wave_file, {}) for wave_file in wave_files)
+        models = self._speakermodels[gender]
+        if not models or not wave_files:
+            return res
+        gender_dir = os.path.join(self.get_path(), gender)
+        tmp_dir = tempfile.mkdtemp(prefix='voiceid_')
+        try:
+            gmm_file = os.path.join(tmp_dir, gender + '.gmm')
+            fm.merge_gmms([os.path.join(gender_dir, model)
+                           for model in models], gmm_file)
+            basename = os.path.join(tmp_dir, 'voices')
+            labels, scores = fm.waves_vs_gmm(basename, wave_files, gmm_file,
+                                             gender)
+            cls = {}
+            sr.manage_ident(basename, gender + '.' + gender + '.gmm', cls,
+                            scores)
+        finally:
+            if not CONFIGURATION.KEEP_INTERMEDIATE_FILES:
+                shutil.rmtree(tmp_dir)
+        for wave_file, label in zip(wave_files, labels):
+            if label in cls:
+                res[wave_file].update(cls[label].speakers)
+        return res
+
     def get_speakers(self):
         """Return a dictionary where the keys are the genders and the values
         are a list of the available speakers models for every gender."""
@@ -417,41 +455,7 @@ class GMMVoiceDB(VoiceDB):
         :rtype: dictionary
         :returns: a dictionary having a computed score for every voice
                 model in the db """
-        speakers = self.get_speakers()[gender]
-        res = {}
-        out = {}
-
-        def _match_voice(self, wave_file, speaker, gender):
-            """Internal routine to run in a Thread"""
-            out[speaker + wave_file + gender] = self.match_voice(wave_file,
-                                                                 speaker,
-                                                                 gender)
-
-        keys = []
-
-        for spk in speakers:
-            out[spk + wave_file + gender] = None
-            if  utils.alive_threads(self.__threads) < self.__maxthreads:
-                keys.append(spk + wave_file + gender)
-                self.__threads[spk + wave_file + gender] = threading.Thread(
-                                            target=_match_voice,
-                                            args=(self, wave_file, spk, gender))
-                self.__threads[spk + wave_file + gender].start()
-            else:
-                while utils.alive_threads(self.__threads) >= self.__maxthreads:
-                    time.sleep(1)
-                keys.append(spk + wave_file + gender)
-                self.__threads[spk + wave_file + gender] = threading.Thread(
-                                      target=_match_voice,
-                                      args=(self, wave_file, spk, gender))
-                self.__threads[spk + wave_file + gender].start()
-
-        for thr in keys:
-            if self.__threads[thr].is_alive():
-                self.__threads[thr].join()
-            res.update(out[thr])
-
-        return res
+        return self.match_voices([wave_file], gender)[wave_file]
 
     def voices_lookup(self, wave_dictionary):
         """Look for the best matching speaker in the db for the given features
@@ -465,76 +469,24 @@ class GMMVoiceDB(VoiceDB):
         :returns: a dictionary having a computed score for every voice
                  model in the db"""
 
-        out = {}
         res = {}
-        keys = []
-
-        def __match_voice(self, wave_file, speaker, gender):
-            """Internal routine to run in a Thread"""
-            try:
-                speakerkey = wave_file + '***' + speaker + gender
-                out[speakerkey] = self.match_voice(wave_file, speaker, gender)
-                
-            except (OSError, IOError):
-                exit(-1)
-
+        waves = {}
         for wave_file in wave_dictionary:
-            gender = wave_dictionary[wave_file]
-            speakers = self.get_speakers()[gender]
-            from voiceid.utils import alive_threads as alive
-            for spk in speakers:
-                speakerkey = wave_file + '***' + spk + gender
-                out[speakerkey] = None
-                if  alive(self.__threads) < self.__maxthreads:
-                    keys.append(speakerkey)
-                    self.__threads[speakerkey] = threading.Thread(
-                                          target=__match_voice,
-                                          args=(self, wave_file, spk, gender))
-                    self.__threads[speakerkey].start()
-                else:
-                    while alive(self.__threads) >= self.__maxthreads:
-                        time.sleep(1)
-                    keys.append(speakerkey)
-                    self.__threads[speakerkey] = threading.Thread(
-                                          target=__match_voice,
-                                          args=(self, wave_file, spk, gender))
-                    self.__threads[speakerkey].start()
-        for thr in keys:
-            if self.__threads[thr].is_alive():
-                self.__threads[thr].join()
-        for thr in out:
-            arr = out[thr]
-            wave_key = thr.split('***')[0]
-            if not wave_key in res: # "old" res.has_key(mfcc_key)
-                res[wave_key] = {}
-            try:
-                c = res[wave_key]
-                
-            except (NameError , KeyError, AttributeError, TypeError), e:
-                
-                print " c = res[wave_key] missing out[" + thr + "]"
-                print e
-                print e.__dict__
-                print e.args
-            try:
-                c.update(arr)
-                
-            except (NameError , KeyError, AttributeError, TypeError), e:
-                
-                print "c.update(arr) missing out[" + thr + "]"
-                print e
-                print c
-                print "arr " + str(arr)
-                print e.__dict__
-                print e.args
-            try:
-                res[wave_key] = c
-                
-            except (NameError , KeyError, AttributeError, TypeError), e:
-                
-                print "res[wave_key] = c missing out[" + thr + "]"
-                print e
-                print e.__dict__
-                print e.args
-            
+            waves.setdefault(wave_dictionary[wave_file], []).append(wave_file)
+        # every batch is scored by one MScore run, so split the waves of a
+        # gender in up to maxthreads batches to keep all the threads busy
+        jobs = []
+        for gender in waves:
+            batch_n = min(self.__maxthreads, len(waves[gender]))
+            jobs.extend((gender, waves[gender][i::batch_n])
+                        for i in range(batch_n))
+
+        def _match_voices(job):
+            """Internal routine to run in a pool thread"""
+            gender, wave_files = job
+            return self.match_voices(wave_files, gender)
+
+        for out in utils.pool_map(_match_voices, jobs, self.__maxthreads):
+            res.update(out)
+
         return res
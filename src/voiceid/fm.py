@@ -33,6 +33,16 @@ if sys.platform == 'win32':
     JAVA_MEM = '1024'
     JAVA_EXE = 'javaw'
 
+# a cluster header of a seg file, with the cluster label and its informations
+SEG_HEADER_RE = re.compile(r'^;; cluster:(\S+)(.*?)[ \t\r]*$', re.M)
+# a single score into the informations of a cluster header
+SEG_SCORE_RE = re.compile(r'\[ score:(\S+) = (\S+) \]')
+# a segment of a seg file: show, channel, start, duration, gender, band,
+# environment and cluster label
+SEG_LINE_RE = re.compile(r'^([^;\s]\S*)[ \t]+(\d+)[ \t]+(\d+)[ \t]+(\d+)'
+                         r'[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)'
+                         r'[ \t\r]*$', re.M)
+
 
 def wave_duration(wavfile):
     """Extract the duration of a wave file in sec.
@@ -48,6 +58,8 @@ def wave_duration(wavfile):
 
 def merge_waves(input_waves, wavename):
     """Take a list of waves and append them to a brend new destination wave.
+    The waves in the same format are just appended, else they are merged
+    by sox.
 
     :type input_waves: list
     :param input_waves: the wave files list
@@ -56,11 +68,55 @@ def merge_waves(input_waves, wavename):
     :param wavename: the output wave file to be generated"""
     #if os.path.exists(wavename):
             #raise Exception("File gmm %s already exist!" % wavename)
-    waves = [w_names.replace(" ", "\ ") for w_names in input_waves]
-    w_names = " ".join(waves)
-    commandline = "sox " + str(w_names) + " " + str(wavename)
-    
-    utils.start_subprocess(commandline)
+    import wave
+    params = None
+    for w_name in input_waves:
+        w_params = utils.wave_params(w_name)
+        if w_params is not None:
+            w_params = w_params[:3] + w_params[4:]
+        if w_params is None or (params is not None and w_params != params):
+            # waves not readable by the wave module (i.e. truncated,
+            # extensible or compressed) or in different formats, let sox
+            # convert them
+            utils.start_subprocess(['sox'] + list(input_waves) + [wavename])
+            return
+        params = w_params
+    w_out = wave.open(wavename, 'wb')
+    try:
+        w_out.setparams(params[:3] + (0,) + params[3:])
+        for w_name in input_waves:
+            w_in = wave.open(w_name, 'rb')
+            try:
+                w_out.writeframes(w_in.readframes(w_in.getnframes()))
+            finally:
+                w_in.close()
+    finally:
+        w_out.close()
+
+
+def _source_stamp(filename):
+    """The size and modification time of a file, saved in "<wave>.src"
+    next to the wave converted from it."""
+    return '%d %r\n' % (os.path.getsize(filename), os.path.getmtime(filename))
+
+
+def _is_converted(filename, wavename):
+    """Check if wavename is a good wave, not empty, converted from filename
+    as it is now (same size and modification time).
+
+    :type filename: string
+    :param filename: the input audio/video file
+
+    :type wavename: string
+    :param wavename: the converted wave file"""
+    if not (os.path.exists(wavename) and os.path.exists(wavename + '.src')):
+        return False
+    stamp_f = open(wavename + '.src', 'r')
+    stamp = stamp_f.read()
+    stamp_f.close()
+    if stamp != _source_stamp(filename) or not utils.is_good_wave(wavename):
+        return False
+    return utils.wave_params(wavename)[3] > 0
 
 
 def file2wav(filename):
@@ -68,6 +124,9 @@ def file2wav(filename):
     "RIFF (little-endian) data, WAVE audio, Microsoft PCM, 16 bit,
     mono 16000 Hz" wave file using gstreamer. If you call it passing a wave it
     checks if in good format, else it converts the wave in the good format.
+    A good wave converted by a previous run is reused, without converting
+    the input again, if the input has still the same size and modification
+    time saved in "<wave>.src".
 
     :type filename: string
     :param filename: the input audio/video file to convert"""
@@ -77,11 +136,29 @@ def file2wav(filename):
     else:
         if ext == '.wav':
             name += '_'
-        utils.start_subprocess("gst-launch filesrc location='" + filename
-           + "' ! decodebin ! audioresample ! 'audio/x-raw-int,rate=16000' !"
-           + " audioconvert !"
-           + " 'audio/x-raw-int,rate=16000,depth=16,signed=true,channels=1' !"
-           + "wavenc ! filesink location=" + name + ".wav ")
+        wavename = name + '.wav'
+        if not _is_converted(filename, wavename):
+            # convert into a temporary file, so that a failed or interrupted
+            # conversion never leaves a wave to reuse
+            partname = wavename + '.part'
+            try:
+                utils.start_subprocess(['gst-launch', 'filesrc',
+                    'location=' + filename, '!', 'decodebin', '!',
+                    'audioresample', '!', 'audio/x-raw-int,rate=16000', '!',
+                    'audioconvert', '!',
+                    'audio/x-raw-int,rate=16000,depth=16,signed=true,'
+                    'channels=1', '!', 'wavenc', '!', 'filesink',
+                    'location=' + partname])
+            except OSError:
+                if os.path.exists(partname):
+                    os.remove(partname)
+                raise
+            if os.path.exists(wavename):
+                os.remove(wavename)
+            os.rename(partname, wavename)
+            stamp_f = open(wavename + '.src', 'w')
+            stamp_f.write(_source_stamp(filename))
+            stamp_f.close()
     utils.ensure_file_exists(name + '.wav')
     return name + ext
 
@@ -108,15 +185,7 @@ def merge_gmms(input_files, output_file):
         line = current_f.read(4)
         num = struct.unpack('>i', line)
         num_gmm += int(num[0])
-        byte = current_f.read(1)
-        all_other = ""
-        
-        while byte:
-            # Do stuff with byte.
-            all_other += byte
-            byte = current_f.read(1)
-            
-        gmms += all_other
+        gmms += current_f.read()
         current_f.close()
 
     num_gmm_string = struct.pack('>i', num_gmm)
@@ -329,38 +398,42 @@ def seg2trim(filebasename):
 
     :type filebasename: string
     :param filebasename: filebasename of the seg and wav input files"""
+    import wave
     segfile = filebasename + '.seg'
     seg = open(segfile, 'r')
-    for line in seg.readlines():
-        if not line.startswith(";;"):
-            arr = line.split()
-            clust = arr[7]
-            start = float(arr[2]) / 100
-            end = float(arr[3]) / 100
-            try:
-                mydir = os.path.join(filebasename, clust)
-                if sys.platform == 'win32':
-                    mydir = filebasename +'/'+ clust
-                os.makedirs(mydir)
-            except os.error, err:
-                if err.errno == 17:
-                    pass
-                else:
-                    raise os.error
-            wave_path = os.path.join(filebasename, clust,
-                                     "%s_%07d.%07d.wav" % (clust, int(start),
-                                                           int(end)))
-            
-            if sys.platform == 'win32':
-                wave_path = filebasename +"/"+ clust +"/"+ "%s_%07d.%07d.wav" % (clust, int(start), int(end))
-            
-            commandline = "sox %s.wav %s trim  %s %s" % (filebasename,
-                                                         wave_path,
-                                                         start, end)    
-                        
-            utils.start_subprocess(commandline)
-            utils.ensure_file_exists(wave_path)
+    lines = SEG_LINE_RE.findall(seg.read())
     seg.close()
+    w_in = wave.open(filebasename + '.wav', 'rb')
+    params = w_in.getparams()
+    rate = w_in.getframerate()
+    nframes = w_in.getnframes()
+    # make the directory of every cluster just once
+    dirs = {}
+    for clust in set(line[7] for line in lines):
+        mydir = os.path.join(filebasename, clust)
+        if sys.platform == 'win32':
+            mydir = filebasename +'/'+ clust
+        if not os.path.isdir(mydir):
+            os.makedirs(mydir)
+        dirs[clust] = mydir
+    for line in lines:
+        clust = line[7]
+        start = float(line[2]) / 100
+        end = float(line[3]) / 100
+        wave_name = "%s_%07d.%07d.wav" % (clust, int(start), int(end))
+        wave_path = os.path.join(dirs[clust], wave_name)
+        if sys.platform == 'win32':
+            wave_path = dirs[clust] + "/" + wave_name
+
+        # seg times are in hundredths of second, cut the frames directly
+        # instead of running a sox trim for every segment
+        w_in.setpos(min(int(line[2]) * rate // 100, nframes))
+        w_out = wave.open(wave_path, 'wb')
+        w_out.setparams(params)
+        w_out.writeframes(w_in.readframes(int(line[3]) * rate // 100))
+        w_out.close()
+        utils.ensure_file_exists(wave_path)
+    w_in.close()
 
 
 def seg2srt(segfile):
@@ -368,31 +441,26 @@ def seg2srt(segfile):
 
     :type segfile: string
     :param segfile: the segmentation file to convert"""
-    def readtime(aline):
-        "Help function for sort, to extract time from line"
-        return int(aline[2])
-
     basename = os.path.splitext(segfile)[0]
     seg = open(segfile, 'r')
-    lines = []
-    for line in seg.readlines():
-        if not line.startswith(";;"):
-            arr = line.split()
-            lines.append(arr)
+    lines = SEG_LINE_RE.findall(seg.read())
     seg.close()
-    lines.sort(key=readtime, reverse=False)
+    starts = [int(line[2]) for line in lines]
+    if any(prev > cur for prev, cur in zip(starts, starts[1:])):
+        order = sorted(range(len(lines)), key=starts.__getitem__)
+        lines = [lines[idx] for idx in order]
+        starts = [starts[idx] for idx in order]
+    blocks = []
+    for row, (line, frame) in enumerate(zip(lines, starts)):
+        start = frame / 100.0
+        end = (frame + int(line[3])) / 100.0
+        blocks.append("%d\n%s --> %s\n%s\n\n" % (row + 1,
+                                                utils.humanize_time(start),
+                                                utils.humanize_time(end),
+                                                line[7]))
     fileoutput = basename + ".srt"
     srtfile = open(fileoutput, "w")
-    row = 0
-    for line in lines:
-        row = row + 1
-        start = float(line[2]) / 100
-        end = start + float(line[3]) / 100
-        srtfile.write(str(row) + "\n")
-        srtfile.write(utils.humanize_time(start) + " --> "
-                      + utils.humanize_time(end) + "\n")
-        srtfile.write(line[7] + "\n")
-        srtfile.write("\n")
+    srtfile.write(''.join(blocks))
     srtfile.close()
     utils.ensure_file_exists(basename + '.srt')
 
@@ -407,20 +475,17 @@ def ident_seg_rename(filebasename, identifier, outputname):
     """Take a seg file and substitute the clusters with a given name or
     identifier."""
     seg_f = open(filebasename + '.seg', 'r')
-    clusters = []
-    lines = seg_f.readlines()
-    for line in lines:
-        for key in line.split():
-            if key.startswith('cluster:'):
-                clu = key.split(':')[1]
-                clusters.append(clu)
+    data = seg_f.read()
     seg_f.close()
+    clusters = [head.group(1) for head in SEG_HEADER_RE.finditer(data)]
+    if clusters:
+        # replace just whole labels, after "cluster:" or as a field, so the
+        # show names are left untouched
+        rec = re.compile(r'(?<![^\s:])(?:%s)(?!\S)'
+                         % '|'.join(map(re.escape, clusters)))
+        data = rec.sub(lambda match: identifier, data)
     output = open(outputname + '.seg', 'w')
-    clusters.reverse()
-    for line in lines:
-        for clu in clusters:
-            line = line.replace(clu, identifier)
-        output.write(line)
+    output.write(data)
     output.close()
     utils.ensure_file_exists(outputname + '.seg')
 
@@ -429,21 +494,18 @@ def srt2subnames(filebasename, key_value):
     """Substitute cluster names with real names in subtitles."""
 
     def replace_words(text, word_dic):
-        """Take a text and replace words that match a key in a dictionary with
-        the associated value, return the changed text"""
-        rec = re.compile('|'.join(map(re.escape, word_dic)))
-
-        def translate(match):
-            "not documented"
-            return word_dic[match.group(0)] + '\n'
-
-        return rec.sub(translate, text)
+        """Take a text and replace the lines that match a key in a dictionary
+        with the associated value, return the changed text"""
+        if not word_dic:
+            return text
+        words = dict((str(key), value) for key, value in word_dic.items())
+        # a key matches just a whole line, so S1 is not replaced into S10
+        rec = re.compile('^(?:%s)$' % '|'.join(map(re.escape, words)), re.M)
+        return rec.sub(lambda match: words[match.group(0)], text)
 
     file_original_subtitle = open(filebasename + ".srt")
     original_subtitle = file_original_subtitle.read()
     file_original_subtitle.close()
-    key_value = dict(map(lambda (key, value): (str(key) + "\n", value),
-                         key_value.items()))
     text = replace_words(original_subtitle, key_value)
     out_file = filebasename + ".ident.srt"
     # create a output file
@@ -476,38 +538,54 @@ def file2trim(filename):
 #--------------------------------------------
 
 
+def _lium(program, arguments, memory=JAVA_MEM):
+    """Run a program of the LIUM jar. If CONFIGURATION.EMBEDDED_JVM is set
+    and JPype is installed the program runs into the JVM embedded in the
+    Python process, otherwise in a new java process.
+
+    :type program: string
+    :param program: the java class of the LIUM program to run
+
+    :type arguments: list
+    :param arguments: the command line arguments of the program
+
+    :type memory: string
+    :param memory: max heap size (MB) of the java process, the embedded JVM
+            always uses JAVA_MEM"""
+    if CONFIGURATION.EMBEDDED_JVM:
+        if utils.start_jvm_main(program, arguments, JAVA_MEM):
+            return
+    utils.start_subprocess([JAVA_EXE, '-Xmx' + memory + 'm',
+                            '-cp', CONFIGURATION.LIUM_JAR, program]
+                           + arguments)
+
 
 def _silence_segmentation(filebasename):
     """Make a basic segmentation file for the wave file,
     cutting off the silence."""
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -cp '
-            + CONFIGURATION.LIUM_JAR
-            + ' fr.lium.spkDiarization.programs.MSegInit '
-            + '--fInputMask=%s.wav '
-            + '--fInputDesc=audio2sphinx,1:1:0:0:0:0,13,0:0:0'
-            + ' --sInputMask= --sOutputMask=%s.s.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MSegInit',
+          ['--fInputMask=%s.wav',
+           '--fInputDesc=audio2sphinx,1:1:0:0:0:0,13,0:0:0',
+           '--sInputMask=', '--sOutputMask=%s.s.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.s.seg')
 
 
 def _gender_detection(filebasename):
     """Build a segmentation file where for every segment is identified
     the gender of the voice."""
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -cp '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MDecode  '
-           + '--fInputMask=%s.wav '
-           + '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,0:0:0 '
-           + '--sInputMask=%s.s.seg --sOutputMask=%s.g.seg '
-           + '--dPenality=10,10,50 --tInputMask=' + CONFIGURATION.SMS_GMMS
-           + ' ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MDecode',
+          ['--fInputMask=%s.wav',
+           '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,0:0:0',
+           '--sInputMask=%s.s.seg', '--sOutputMask=%s.g.seg',
+           '--dPenality=10,10,50', '--tInputMask=' + CONFIGURATION.SMS_GMMS,
+           filebasename])
     utils.ensure_file_exists(filebasename + '.g.seg')
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -cp '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MScore --help  --sGender '
-           + '--sByCluster '
-           + '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:1:0:0 '
-           + '--fInputMask=%s.wav --sInputMask=%s.g.seg --sOutputMask=%s.seg '
-           + '--tInputMask=' + CONFIGURATION.GENDER_GMMS + ' ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MScore',
+          ['--help', '--sGender', '--sByCluster',
+           '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:1:0:0',
+           '--fInputMask=%s.wav', '--sInputMask=%s.g.seg',
+           '--sOutputMask=%s.seg',
+           '--tInputMask=' + CONFIGURATION.GENDER_GMMS, filebasename])
     utils.ensure_file_exists(filebasename + '.seg')
 
 
@@ -517,11 +595,12 @@ def diarization_standard(filebasename):
 
     :type filebasename: string
     :param filebasename: the basename of the wav file to process"""
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -jar '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.system.Diarization '
-           + '--fInputMask=%s.wav --sOutputMask=%s.seg --doCEClustering '
-           + filebasename)
+    # the class name is passed again as first argument, like in the former
+    # "java -jar" call, on purpose
+    _lium('fr.lium.spkDiarization.system.Diarization',
+          ['fr.lium.spkDiarization.system.Diarization',
+           '--fInputMask=%s.wav', '--sOutputMask=%s.seg', '--doCEClustering',
+           filebasename])
     utils.ensure_file_exists(filebasename + '.seg')
 
 
@@ -532,140 +611,120 @@ def diarization(filebasename, h_par='3', c_par='1.5'):
 
     :type filebasename: string
     :param filebasename: the basename of the wav file to process"""
-#    par=' --help --trace '
-    par = ''
+#    par = ['--help', '--trace']
+    par = []
     #generate_uem_seg(filebasename)
     st_fdesc = "audio2sphinx,1:1:0:0:0:0,13,0:0:0"
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MSegInit  '
-           + par + ' --fInputMask=%s.wav --fInputDesc='
-           + st_fdesc + ' '
-           + ' --sOutputMask=%s.i.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MSegInit',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + st_fdesc,
+                 '--sOutputMask=%s.i.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.i.seg')
 
     #Speech/Music/Silence segmentation
     md_fdesk = 'audio2sphinx,1:3:2:0:0:0,13,0:0:0'
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MDecode  '
-           + par + '  --fInputMask=%s.wav  --fInputDesc='
-           + md_fdesk + ' --sInputMask=%s.i.seg     --tInputMask='
-           + CONFIGURATION.SMS_GMMS
-           + ' --dPenality=10,10,50  --sOutputMask=%s.pms.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MDecode',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + md_fdesk,
+                 '--sInputMask=%s.i.seg',
+                 '--tInputMask=' + CONFIGURATION.SMS_GMMS,
+                 '--dPenality=10,10,50', '--sOutputMask=%s.pms.seg',
+                 filebasename])
     utils.ensure_file_exists(filebasename + '.pms.seg')
 
     #GLR based segmentation, make small segments
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR + ' fr.lium.spkDiarization.programs.MSeg  '
-           + par + ' --fInputMask=%s.wav --fInputDesc=' + st_fdesc
-           + '    --sInputMask=%s.i.seg  '
-           + ' --kind=FULL --sMethod=GLR --sOutputMask=%s.s.seg '
-           + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MSeg',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + st_fdesc,
+                 '--sInputMask=%s.i.seg', '--kind=FULL', '--sMethod=GLR',
+                 '--sOutputMask=%s.s.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.s.seg')
 
     # linear clustering
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MClust ' + par
-           + ' --fInputMask=%s.wav --fInputSpeechThr=0.1 --fInputDesc=' + st_fdesc
-           + ' --sInputMask=%s.s.seg --cMethod=l --cThr=2 '
-           + '--sOutputMask=%s.l.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MClust',
+          par + ['--fInputMask=%s.wav', '--fInputSpeechThr=0.1',
+                 '--fInputDesc=' + st_fdesc, '--sInputMask=%s.s.seg',
+                 '--cMethod=l', '--cThr=2', '--sOutputMask=%s.l.seg',
+                 filebasename])
     utils.ensure_file_exists(filebasename + '.l.seg')
 
     # hierarchical clustering
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MClust ' + par
-           + ' --fInputMask=%s.wav --fInputDesc=' + st_fdesc
-           + ' --sInputMask=%s.l.seg --cMethod=h --cThr=' + h_par
-           + '  --sOutputMask=%s.h.' + h_par + '.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MClust',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + st_fdesc,
+                 '--sInputMask=%s.l.seg', '--cMethod=h', '--cThr=' + h_par,
+                 '--sOutputMask=%s.h.' + h_par + '.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.h.' + h_par + '.seg')
 
     # initialize GMM
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MTrainInit '
-           + par + ' --fInputMask=%s.wav --fInputDesc='
-           + st_fdesc + '    --sInputMask=%s.h.' + h_par
-           + '.seg --nbComp=8 --kind=DIAG    --tOutputMask=%s.init.gmms '
-           + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MTrainInit',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + st_fdesc,
+                 '--sInputMask=%s.h.' + h_par + '.seg', '--nbComp=8',
+                 '--kind=DIAG', '--tOutputMask=%s.init.gmms', filebasename])
     utils.ensure_file_exists(filebasename + '.init.gmms')
 
     # EM computation
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MTrainEM ' + par
-           + ' --fInputMask=%s.wav --fInputDesc=' + st_fdesc
-           + ' --sInputMask=%s.h.' + h_par
-           + '.seg --tInputMask=%s.init.gmms --nbComp=8 '
-           + '--kind=DIAG --tOutputMask=%s.gmms ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MTrainEM',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + st_fdesc,
+                 '--sInputMask=%s.h.' + h_par + '.seg',
+                 '--tInputMask=%s.init.gmms', '--nbComp=8', '--kind=DIAG',
+                 '--tOutputMask=%s.gmms', filebasename])
     utils.ensure_file_exists(filebasename + '.gmms')
 
     #Viterbi decoding
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MDecode '
-           + par + ' --fInputMask=%s.wav  --fInputDesc='
-           + st_fdesc + ' --sInputMask=%s.h.' + h_par
-           + '.seg  --tInputMask=%s.gmms --dPenality=250'
-           + '  --sOutputMask=%s.d.' + h_par + '.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MDecode',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + st_fdesc,
+                 '--sInputMask=%s.h.' + h_par + '.seg',
+                 '--tInputMask=%s.gmms', '--dPenality=250',
+                 '--sOutputMask=%s.d.' + h_par + '.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.d.' + h_par + '.seg')
 
     #Adjust segment boundaries
     s_desc = 'audio2sphinx,1:1:0:0:0:0,13,0:0:0'
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR + ' fr.lium.spkDiarization.tools.SAdjSeg '
-           + par + '  --fInputMask=%s.wav  --fInputDesc=' + s_desc
-           + '    --sInputMask=%s.d.' + h_par + '.seg   --sOutputMask=%s.adj.'
-           + h_par + '.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.tools.SAdjSeg',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + s_desc,
+                 '--sInputMask=%s.d.' + h_par + '.seg',
+                 '--sOutputMask=%s.adj.' + h_par + '.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.adj.' + h_par + '.seg')
 
     #filter spk segmentation according pms segmentation
     fl_desc = 'audio2sphinx,1:3:2:0:0:0,13,0:0:0'
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR + ' fr.lium.spkDiarization.tools.SFilter '
-           + par + '  --fInputMask=%s.wav  --fInputDesc=' + fl_desc
-           + '   --sInputMask=%s.adj.' + h_par
-           + '.seg  --fltSegMinLenSpeech=150 --fltSegMinLenSil=25 '
-           + '--sFilterClusterName=j --fltSegPadding=25 '
-           + '--sFilterMask=%s.pms.seg --sOutputMask=%s.flt.'
-           + h_par + '.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.tools.SFilter',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + fl_desc,
+                 '--sInputMask=%s.adj.' + h_par + '.seg',
+                 '--fltSegMinLenSpeech=150', '--fltSegMinLenSil=25',
+                 '--sFilterClusterName=j', '--fltSegPadding=25',
+                 '--sFilterMask=%s.pms.seg',
+                 '--sOutputMask=%s.flt.' + h_par + '.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.flt.' + h_par + '.seg')
 
     #Split segment longer than 20s
     ss_desc = 'audio2sphinx,1:3:2:0:0:0,13,0:0:0'
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR + ' fr.lium.spkDiarization.tools.SSplitSeg '
-           + par + '  --fInputMask=%s.wav  --fInputDesc=' + ss_desc
-           + ' --sInputMask=%s.flt.' + h_par + '.seg  --tInputMask='
-           + CONFIGURATION.S_GMMS + ' --sFilterMask=%s.pms.seg '
-           + '--sFilterClusterName=iS,iT,j  --sOutputMask=%s.spl.' + h_par
-           + '.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.tools.SSplitSeg',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + ss_desc,
+                 '--sInputMask=%s.flt.' + h_par + '.seg',
+                 '--tInputMask=' + CONFIGURATION.S_GMMS,
+                 '--sFilterMask=%s.pms.seg',
+                 '--sFilterClusterName=iS,iT,j',
+                 '--sOutputMask=%s.spl.' + h_par + '.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.spl.' + h_par + '.seg')
 
     #Set gender and bandwith
     f_desc_clr = "audio2sphinx,1:3:2:0:0:0,13,1:1:300:4"
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR + ' fr.lium.spkDiarization.programs.MScore '
-           + par + ' --fInputMask=%s.wav --fInputDesc=' + f_desc_clr
-           + ' --sInputMask=%s.spl.' + h_par + '.seg --tInputMask='
-           + CONFIGURATION.GENDER_GMMS
-           + ' --sGender --sByCluster --sOutputMask=%s.g.'
-           + h_par + '.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MScore',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + f_desc_clr,
+                 '--sInputMask=%s.spl.' + h_par + '.seg',
+                 '--tInputMask=' + CONFIGURATION.GENDER_GMMS,
+                 '--sGender', '--sByCluster',
+                 '--sOutputMask=%s.g.' + h_par + '.seg', filebasename])
     utils.ensure_file_exists(filebasename + '.g.' + h_par + '.seg')
 
-    utils.start_subprocess(JAVA_EXE +' -Xmx' + JAVA_MEM + 'm -classpath '
-           + CONFIGURATION.LIUM_JAR
-           + ' fr.lium.spkDiarization.programs.MClust ' + par
-           + ' --fInputMask=%s.wav --fInputDesc=' + f_desc_clr
-           + ' --sInputMask=%s.g.' + h_par + '.seg   –fInputSpeechThr=1 --tInputMask='
-           + CONFIGURATION.UBM_PATH + ' --cMethod=ce --cThr=' + c_par
-           + ' --emCtrl=1,5,0.01 --sTop=5,'
-           + CONFIGURATION.UBM_PATH
-           + ' --tOutputMask=%s.c.gmm --sOutputMask=%s.seg ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MClust',
+          par + ['--fInputMask=%s.wav', '--fInputDesc=' + f_desc_clr,
+                 '--sInputMask=%s.g.' + h_par + '.seg',
+                 '–fInputSpeechThr=1',
+                 '--tInputMask=' + CONFIGURATION.UBM_PATH, '--cMethod=ce',
+                 '--cThr=' + c_par, '--emCtrl=1,5,0.01',
+                 '--sTop=5,' + CONFIGURATION.UBM_PATH,
+                 '--tOutputMask=%s.c.gmm', '--sOutputMask=%s.seg',
+                 filebasename])
     utils.ensure_file_exists(filebasename + '.seg')
-
     if not CONFIGURATION.KEEP_INTERMEDIATE_FILES:
         f_list = ['.i.seg', '.pms.seg', '.s.seg', '.l.seg',
                   '.h.' + h_par + '.seg', '.init.gmms', '.gmms',
@@ -678,23 +737,22 @@ def diarization(filebasename, h_par='3', c_par='1.5'):
 
 def _train_init(filebasename):
     """Train the initial speaker gmm model."""
-    utils.start_subprocess(JAVA_EXE +' -Xmx256m -cp ' + CONFIGURATION.LIUM_JAR
-        + ' fr.lium.spkDiarization.programs.MTrainInit '
-        + '--sInputMask=%s.ident.seg --fInputMask=%s.wav '
-        + '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:1:300:4 '
-        + '--emInitMethod=copy --tInputMask=' + CONFIGURATION.UBM_PATH
-        + ' --tOutputMask=%s.init.gmm ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MTrainInit',
+          ['--sInputMask=%s.ident.seg', '--fInputMask=%s.wav',
+           '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:1:300:4',
+           '--emInitMethod=copy', '--tInputMask=' + CONFIGURATION.UBM_PATH,
+           '--tOutputMask=%s.init.gmm', filebasename], '256')
     utils.ensure_file_exists(filebasename + '.init.gmm')
 
 
 def _train_map(filebasename):
     """Train the speaker model using a MAP adaptation method."""
-    utils.start_subprocess(JAVA_EXE +' -Xmx256m -cp ' + CONFIGURATION.LIUM_JAR
-        + ' fr.lium.spkDiarization.programs.MTrainMAP --sInputMask=%s.ident.seg'
-        + ' --fInputMask=%s.wav '
-        + '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:1:300:4 '
-        + '--tInputMask=%s.init.gmm --emCtrl=1,5,0.01 --varCtrl=0.01,10.0 '
-        + '--tOutputMask=%s.gmm ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MTrainMAP',
+          ['--sInputMask=%s.ident.seg', '--fInputMask=%s.wav',
+           '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:1:300:4',
+           '--tInputMask=%s.init.gmm', '--emCtrl=1,5,0.01',
+           '--varCtrl=0.01,10.0', '--tOutputMask=%s.gmm', filebasename],
+          '256')
     
     utils.ensure_file_exists(filebasename + '.gmm')
 
@@ -719,26 +777,109 @@ def wav_vs_gmm(filebasename, gmm_file, gender, custom_db_dir=None):
     if custom_db_dir != None:
         database = custom_db_dir
     gmm_name = os.path.split(gmm_file)[1]
-    if sys.platform == 'win32':
-        utils.start_subprocess(JAVA_EXE +' -Xmx256M -cp ' + CONFIGURATION.LIUM_JAR
-        + ' fr.lium.spkDiarization.programs.MScore --sInputMask=%s.seg '
-        + '--fInputMask=%s.wav --sOutputMask=%s.ident.' + gender + '.'
-        + gmm_name + '.seg --sOutputFormat=seg,UTF8 '
-        + '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:0:300:4 '
-        + '--tInputMask=' + database + '\\' + gender + '\\' + gmm_file
-        + ' --sTop=8,' + CONFIGURATION.UBM_PATH
-        + '  --sSetLabel=add --sByCluster ' + filebasename)
-    else:
-        utils.start_subprocess(JAVA_EXE +' -Xmx256M -cp ' + CONFIGURATION.LIUM_JAR
-        + ' fr.lium.spkDiarization.programs.MScore --sInputMask=%s.seg '
-        + '--fInputMask=%s.wav --sOutputMask=%s.ident.' + gender + '.'
-        + gmm_name + '.seg --sOutputFormat=seg,UTF8 '
-        + '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:0:300:4 '
-        + '--tInputMask=' + database + '/' + gender + '/' + gmm_file
-        + ' --sTop=8,' + CONFIGURATION.UBM_PATH
-        + '  --sSetLabel=add --sByCluster ' + filebasename)
+    _lium('fr.lium.spkDiarization.programs.MScore',
+          ['--sInputMask=%s.seg', '--fInputMask=%s.wav',
+           '--sOutputMask=%s.ident.' + gender + '.' + gmm_name + '.seg',
+           '--sOutputFormat=seg,UTF8',
+           '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:0:300:4',
+           '--tInputMask=' + os.path.join(database, gender, gmm_file),
+           '--sTop=8,' + CONFIGURATION.UBM_PATH,
+           '--sSetLabel=add', '--sByCluster', filebasename], '256')
+    utils.ensure_file_exists(filebasename + '.ident.'
+                             + gender + '.' + gmm_name + '.seg')
+
+
+def waves_vs_gmm(filebasename, wave_files, gmm_file, gender):
+    """Match a list of wave files against all the voice models contained in
+    a gmm file, running a single MScore for all of them.
+    The seg files of the waves are joined in "<filebasename>.seg", labelling
+    the cluster of every wave as W<index>, and the scores are written in
+    "<filebasename>.ident.<gender>.<gmm name>.seg", or given back directly
+    when computed into the embedded JVM.
+    Notice that a cluster header has one score for every model name: the
+    MScore of the shipped LIUM jar keeps the last score when more models
+    share a name (the patched src/fr/.../MScore.java keeps the best one).
+
+    :type filebasename: string
+    :param filebasename: the basename of the seg files to generate
+
+    :type wave_files: list
+    :param wave_files: the wave files to match, each one having its own seg
+            file with the same basename
+
+    :type gmm_file: string
+    :param gmm_file: the path of the gmm file containing the voice models
+
+    :type gender: char
+    :param gender: F, M or U, the gender of the voice models
+
+    :rtype: tuple
+    :returns: the cluster labels, in the same order of wave_files, and the
+            scores of every output cluster label if computed into the
+            embedded JVM (see CONFIGURATION.EMBEDDED_JVM), else None since
+            they are in the output seg file"""
+    labels = []
+    seg_f = open(filebasename + '.seg', 'w')
+    for wave_file in wave_files:
+        label = 'W%d' % len(labels)
+        labels.append(label)
+        wave_seg = open(os.path.splitext(wave_file)[0] + '.seg', 'r')
+        for line in wave_seg:
+            arr = line.split()
+            if line.startswith(';;'):
+                arr[1] = 'cluster:' + label
+            else:
+                arr[-1] = label
+            seg_f.write(' '.join(arr) + '\n')
+        wave_seg.close()
+    seg_f.close()
+    gmm_name = os.path.split(gmm_file)[1]
+    arguments = ['--sInputMask=%s.seg', '--fInputMask=%s.wav',
+           '--sOutputMask=%s.ident.' + gender + '.' + gmm_name + '.seg',
+           '--sOutputFormat=seg,UTF8',
+           '--fInputDesc=audio2sphinx,1:3:2:0:0:0,13,1:0:300:4',
+           '--tInputMask=' + gmm_file, '--sTop=8,' + CONFIGURATION.UBM_PATH,
+           '--sSetLabel=add', '--sByCluster', filebasename]
+    if CONFIGURATION.EMBEDDED_JVM:
+        try:
+            return labels, utils.run_in_jvm(_jvm_scores, JAVA_MEM, arguments)
+        except ImportError:
+            pass
+    _lium('fr.lium.spkDiarization.programs.MScore', arguments)
     utils.ensure_file_exists(filebasename + '.ident.'
                              + gender + '.' + gmm_name + '.seg')
+    return labels, None
+
+
+def _jvm_scores(jpype, arguments):
+    """Score the clusters like the main of LIUM MScore does, but into the
+    embedded JVM and giving back the scores instead of writing the output
+    seg file.
+
+    :type arguments: list
+    :param arguments: the MScore command line arguments
+
+    :rtype: dictionary
+    :returns: a dictionary having for every cluster label of the output the
+            score computed for every voice model"""
+    lium = jpype.JPackage('fr').lium.spkDiarization
+    tools = lium.lib.MainTools
+    param = tools.getParameters(jpype.JArray(jpype.JString)(arguments))
+    clusters = tools.readClusterSet(param)
+    features = tools.readFeatureSet(param, clusters)
+    gmm_tops = tools.readGMMForTopGaussian(param, features)
+    gmms = tools.readGMMContainer(param)
+    result = lium.programs.MScore.make(features, clusters, gmms, gmm_tops,
+                                       param)
+    scores = {}
+    for label in result:
+        information = result.getCluster(label).getInformation()
+        scores[str(label)] = dict((str(key)[len('score:'):],
+                                   float(str(information.get(key))))
+                                  for key in information.keySet()
+                                  if str(key).startswith('score:'))
+    return scores
+
     
 #     f = open(filebasename + '.ident.'
 #                              + gender + '.' + gmm_name + '.seg', "r")
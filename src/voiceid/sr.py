@@ -19,10 +19,11 @@
 #
 #############################################################################
 from voiceid import VConf, utils, fm
+from operator import itemgetter
+import heapq
 import os
 import shlex
 import shutil
-import subprocess
 import sys
 import threading
 import time
@@ -218,11 +219,9 @@ class Cluster(object):
         :param score: score computed between the cluster
                 wave and speaker model"""
         val = float(score)
-        if not identifier in self.speakers:
+        current = self.speakers.get(identifier)
+        if current is None or current < val:
             self.speakers[identifier] = val
-        else:
-            if self.speakers[identifier] < val:
-                self.speakers[identifier] = val
 
     def get_speaker(self):
         """Set the right speaker for the cluster if not set and returns
@@ -260,16 +259,18 @@ class Cluster(object):
          :rtype: string
          :returns: the best speaker matching the cluster wav"""
         max_val = -33.0
-        try:
-            self.value = max(self.speakers.values())
-        except ValueError:
+        best_two = self._get_best_two()
+        if best_two:
+            self.value = best_two[0][1]
+        else:
             self.value = -100
         _speaker = 'unknown'
-        distance = self.get_distance()
-        
-        if len(self.speakers.values()) >1:
-            mean_distance = self.get_m_distance()
+
+        if len(best_two) > 1:
+            distance = abs(best_two[1][1]) - abs(best_two[0][1])
+            mean_distance = abs(abs(self.value) - abs(self.get_mean()))
         else:
+            distance = -1
             mean_distance = .5
             
         thres = 0
@@ -279,10 +280,7 @@ class Cluster(object):
         else: thres = max_val
         
         if self.value >= thres and mean_distance > .49:
-            for spk in self.speakers:
-                if self.speakers[spk] == self.value:
-                    _speaker = spk
-                    break
+            _speaker = best_two[0][0]
        
         if distance > -1 and distance < .07:
             _speaker = 'unknown'
@@ -322,12 +320,15 @@ class Cluster(object):
     def get_distance(self):
         """Get the distance between the best speaker score and the closest
         speaker score."""
-        values = self.speakers.values()
-        values.sort(reverse=True)
-        try:
-            return abs(values[1]) - abs(values[0])
-        except (IndexError, ValueError):
+        best_two = self._get_best_two()
+        if len(best_two) < 2:
             return -1
+        return abs(best_two[1][1]) - abs(best_two[0][1])
+
+    def _get_best_two(self):
+        """Get the two best (speaker, score) tuples, ordered by score, with a
+        single pass over the scores."""
+        return heapq.nlargest(2, self.speakers.iteritems(), key=itemgetter(1))
 
     def get_m_distance(self):
         """Get the distance between the best speaker score and the mean of
@@ -791,27 +792,28 @@ class Voiceid(object):
     def _extract_clusters(self):
         extract_clusters(self._basename + '.seg', self._clusters)
 
-    def _match_clusters(self, interactive=False, quiet=False):
+    def _match_clusters(self, interactive=False, quiet=False, thrd_n=1):
         """Match for voices in the db"""
         basename = self.get_file_basename()
-        #merging segments wave files for every cluster
-        for cluster in self._clusters:
+
+        def _prepare_cluster(cluster):
+            """Merge the segments wave files of a cluster and write its seg
+            file, run in a pool thread"""
             self[cluster].merge_waves()
             self[cluster].generate_seg_file(os.path.join(basename,
                                                          cluster + ".seg"))
-        wav_files = {}
-        for cluster in self._clusters:
-            filebasename = os.path.join(basename, cluster) + '.wav'
-            wav_files[ filebasename ] = self[cluster].gender
-        result = self.get_db().voices_lookup(wav_files)
-
-        def wav_to_cluster(wav):
-            return wav.split(os.path.sep)[-1].split(".")[0]
-
-        for spk in result:
-            cluster = wav_to_cluster(spk)
-            for r in result[spk]:
-                self[cluster].add_speaker(r, result[spk][r])
+
+        # the cluster, its wave and gender, shared by all the steps below
+        jobs = [(cluster, os.path.join(basename, cluster) + '.wav',
+                 self[cluster].gender) for cluster in self._clusters]
+        #merging segments wave files for every cluster
+        utils.pool_map(_prepare_cluster, [job[0] for job in jobs], thrd_n)
+        result = self.get_db().voices_lookup(
+                        dict((wav, gender) for cluster, wav, gender in jobs))
+        for cluster, wav, gender in jobs:
+            scores = result.get(wav, {})
+            for speaker in scores:
+                self[cluster].add_speaker(speaker, scores[speaker])
         if not quiet:
             print ""
         speakers = {}
@@ -1007,7 +1009,7 @@ class Voiceid(object):
         """Match for voices in the db"""
         basename = self.get_file_basename()
         self._extract_clusters()
-        self._match_clusters(interactive, quiet)
+        self._match_clusters(interactive, quiet, thrd_n)
 #        if not interactive:
 #            #merging
 #            self.automerge_clusters()
@@ -1406,65 +1408,67 @@ class Voiceid(object):
             file_xmp.write(str(self.to_xmp_string()))
             file_xmp.close()
 
-def manage_ident(filebasename, gmm, clusters):
-    """Take all the files created by the call of wav_vs_gmm() on the whole
-    speakers db and put all the results in a bidimensional dictionary."""
-    seg_f = open("%s.ident.%s.seg" % (filebasename, gmm), "r")
-    for line in seg_f:
-        if line.startswith(";;"):
-#             print line
-            splitted_line = line.split()[1].split(':')[1].split('_')
-#             print splitted_line
-            try:
-                cluster, speaker = splitted_line
-            except:
-                speaker = splitted_line[0]
-            idx = line.index('score:' + speaker) + len('score:' + speaker + " = ")
-            iidx = line.index(']', idx) - 1
-            value = line[idx:iidx]
-            if not cluster in clusters:
-                clusters[cluster] = Cluster(cluster, 'U', '0', '', cluster)
+def manage_ident(filebasename, gmm, clusters, scores=None):
+    """Take all the files created by the call of wav_vs_gmm() or
+    waves_vs_gmm() on the whole speakers db and put all the results in a
+    bidimensional dictionary. Every cluster header can carry the scores of
+    more voice models.
+
+    :type scores: dictionary
+    :param scores: the scores for every cluster label already computed by
+            waves_vs_gmm(), if None they are read from the ident seg file"""
+    if scores is None:
+        scores = {}
+        seg_f = open("%s.ident.%s.seg" % (filebasename, gmm), "r")
+        data = seg_f.read()
+        seg_f.close()
+        for header in fm.SEG_HEADER_RE.finditer(data):
+            scores[header.group(1)] = dict(
+                                fm.SEG_SCORE_RE.findall(header.group(2)))
+        if not CONFIGURATION.KEEP_INTERMEDIATE_FILES:
+            os.remove("%s.ident.%s.seg" % (filebasename, gmm))
+    for label in scores:
+        cluster = label.split('_')[0]
+        if not cluster in clusters:
+            clusters[cluster] = Cluster(cluster, 'U', '0', '', cluster)
+        for speaker, value in scores[label].iteritems():
+            if speaker in ('UBM', 'lenght'):
+                continue
             clusters[cluster].add_speaker(speaker, value)
-    seg_f.close()
-    if not CONFIGURATION.KEEP_INTERMEDIATE_FILES:
-        os.remove("%s.ident.%s.seg" % (filebasename, gmm))
 
 def extract_clusters(segfilename, clusters):
     """Read _clusters from segmentation file."""
     f_seg = open(segfilename, "r")
-    last_cluster = None
-    rows = f_seg.readlines()
+    data = f_seg.read()
     f_seg.close()
-    if ' '.join(rows).find(';;') != -1:
-        for line in rows:
-            if line.startswith(";;"):
-                speaker_id = line.split()[1].split(':')[1]
-                clusters[speaker_id] = Cluster(identifier='unknown',
-                                                 gender='U',
-                                                 frames=0,
-                                                 dirname=os.path.splitext(
-                                                        segfilename)[0],
-                                                 label=speaker_id)
-                last_cluster = clusters[ speaker_id ]
-                last_cluster._seg_header = line
-            else:
-                line = line.split()
-                last_cluster._segments.append(Segment(line))
+    dirname = os.path.splitext(segfilename)[0]
+    headers = list(fm.SEG_HEADER_RE.finditer(data))
+    if headers:
+        ends = [head.start() for head in headers[1:]] + [len(data)]
+        for header, end in zip(headers, ends):
+            speaker_id = header.group(1)
+            clusters[speaker_id] = Cluster(identifier='unknown',
+                                             gender='U',
+                                             frames=0,
+                                             dirname=dirname,
+                                             label=speaker_id)
+            last_cluster = clusters[ speaker_id ]
+            last_cluster._seg_header = header.group(0) + '\n'
+            for line in fm.SEG_LINE_RE.findall(data, header.end(), end):
+                last_cluster._segments.append(Segment(list(line)))
                 last_cluster._frames += int(line[3])
                 last_cluster.gender = line[4]
                 last_cluster._env = line[5]
     else:
-        for line in rows:
-            line = line.split()
+        for line in fm.SEG_LINE_RE.findall(data):
             speaker_id = line[-1]
             if not speaker_id in clusters:
                 clusters[speaker_id] = Cluster(identifier='unknown',
                                                  gender='U',
                                                  frames=0,
-                                                 dirname=os.path.splitext(
-                                                            segfilename)[0],
+                                                 dirname=dirname,
                                                  label=speaker_id)
-            clusters[speaker_id]._segments.append(Segment(line))
+            clusters[speaker_id]._segments.append(Segment(list(line)))
             clusters[speaker_id]._frames += int(line[3])
             clusters[speaker_id].gender = line[4]
             clusters[speaker_id]._env = line[5]
@@ -1501,9 +1505,7 @@ def _interactive_training(filebasename, cluster, identifier):
                 commandline = commandline.replace('\\', '\\\\')
             print "  Listening %s..." % cluster
             args = shlex.split(commandline)
-            prc = subprocess.Popen(args, stdin=CONFIGURATION.output_redirect,
-                                   stdout=CONFIGURATION.output_redirect,
-                                   stderr=CONFIGURATION.output_redirect)
+            prc = utils.open_subprocess(args)
             time.sleep(1)
             continue
         if char == "2":
@@ -19,58 +19,89 @@
 #
 #############################################################################
 from . import VConf
+from multiprocessing.pool import ThreadPool
 import os
 import shlex
+import struct
 import subprocess
 import sys
+import threading
 """Module containing some utilities about subprocess,
 threading and file checking."""
 
 CONFIGURATION = VConf()
 
+_JVM_LOCK = threading.Lock()
 
-def alive_threads(t_dict):
-    """Check how much threads are running and alive in a thread dictionary
 
-    :type t: dictionary
-    :param t: thread dictionary like  { key : thread_obj, ... }"""
-    num = 0
-    for thr in t_dict:
-        if t_dict[thr].is_alive():
-            num += 1
-    return num
+def pool_map(func, jobs, thrd_n):
+    """Run func over every job using at most thrd_n worker threads, a
+    worker picks up the next job as soon as it finishes the previous one.
+
+    :type func: function
+    :param func: the function to apply to every job
+
+    :type jobs: list
+    :param jobs: the arguments to pass, one at a time, to func
+
+    :type thrd_n: integer
+    :param thrd_n: max number of threads running together
+
+    :rtype: list
+    :returns: the results of func, in the same order of jobs"""
+    if not jobs:
+        return []
+    pool = ThreadPool(min(max(thrd_n, 1), len(jobs)))
+    try:
+        return pool.map(func, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def open_subprocess(args, **kwargs):
+    """Start a subprocess, without waiting for it, having its standard
+    streams redirected to the null device, unless in verbose mode where
+    it shares the ones of the Python process.
+
+    :type args: list
+    :param args: the command to run, as a list of arguments
+
+    :param kwargs: more keyword arguments for subprocess.Popen
+
+    :rtype: subprocess.Popen
+    :returns: the started subprocess"""
+    if CONFIGURATION.VERBOSE:
+        return subprocess.Popen(args, **kwargs)
+    dev_null = open(os.devnull, 'r+')
+    try:
+        return subprocess.Popen(args, stdin=dev_null, stdout=dev_null,
+                                stderr=dev_null, **kwargs)
+    finally:
+        dev_null.close()
 
 
 def start_subprocess(commandline):
     """Start a subprocess using the given commandline and check for correct
     termination.
 
-    :type commandline: string
-    :param commandline: the command to run in a subprocess"""
-    if sys.platform == 'win32':
-        commandline = commandline.replace('\\','\\\\')
-        
+    :type commandline: list or string
+    :param commandline: the command to run in a subprocess, better as a
+            list of arguments; a string is split in arguments by shlex"""
+    args = commandline
+    if isinstance(commandline, basestring):
+        if sys.platform == 'win32':
+            commandline = commandline.replace('\\','\\\\')
         args = shlex.split(commandline)
+    else:
+        commandline = ' '.join(commandline)
+    if sys.platform == 'win32':
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-        proc = subprocess.Popen(args, stdin=CONFIGURATION.output_redirect,
-                             stdout=CONFIGURATION.output_redirect,
-                             stderr=CONFIGURATION.output_redirect, startupinfo=startupinfo)
+        proc = open_subprocess(args, startupinfo=startupinfo)
     else:
-        #print commandline
-        args = shlex.split(commandline)
-#         print commandline
-        proc = subprocess.Popen(args, stdin=CONFIGURATION.output_redirect,
-                             stdout=CONFIGURATION.output_redirect,
-                             stderr=CONFIGURATION.output_redirect)
+        proc = open_subprocess(args)
     retval = proc.wait()
-#    except:
-#        print "except 1327"
-#        args = commandline.split(' ')
-#        proc = subprocess.Popen(args, stdin=output_redirect, 
-#                                stdout=output_redirect, 
-#                             stderr=output_redirect)
-#        retval = proc.wait()        
 
     if retval != 0:
         err = OSError("Subprocess %s closed unexpectedly [%s]" % (str(proc),
@@ -79,6 +110,74 @@ def start_subprocess(commandline):
         raise err
 
 
+def run_in_jvm(function, memory, *args):
+    """Call function(jpype, *args) into a JVM embedded in the Python
+    process using JPype. The JVM is started, with the LIUM jar in its
+    classpath, at the first call and then reused, to save the JVM start up
+    of every call. The calls are serialized, since the LIUM programs share
+    some static state.
+    Notice that a LIUM program calling System.exit() (i.e. on a missing
+    input file) terminates the whole process.
+
+    :type function: function
+    :param function: the function to call, taking the jpype module as first
+            argument
+
+    :type memory: string
+    :param memory: max heap size (MB) of the JVM, used just when it starts
+
+    :returns: the value returned by function
+
+    :raises: ImportError if JPype is not available, so that the caller can
+            run the program in a new java process"""
+    import jpype
+    with _JVM_LOCK:
+        if not jpype.isJVMStarted():
+            jpype.startJVM(jpype.getDefaultJVMPath(), '-Xmx%sm' % memory,
+                           '-Djava.class.path=' + CONFIGURATION.LIUM_JAR)
+            if not CONFIGURATION.VERBOSE:
+                java = jpype.java
+                java.lang.System.setOut(java.io.PrintStream(
+                                    java.io.FileOutputStream(os.devnull)))
+                java.lang.System.setErr(java.io.PrintStream(
+                                    java.io.FileOutputStream(os.devnull)))
+        if not jpype.isThreadAttachedToJVM():
+            jpype.attachThreadToJVM()
+        try:
+            return function(jpype, *args)
+        except jpype.JavaException, exc:
+            raise OSError("Java call %s closed unexpectedly [%s]"
+                          % (function.__name__, exc))
+
+
+def start_jvm_main(main_class, args, memory):
+    """Run the main method of a java class into the embedded JVM (see
+    run_in_jvm()).
+
+    :type main_class: string
+    :param main_class: the java class with the main method to run
+
+    :type args: list
+    :param args: the arguments to pass to the main method
+
+    :type memory: string
+    :param memory: max heap size (MB) of the JVM, used just when it starts
+
+    :rtype: boolean
+    :returns: False if JPype is not available, so that the caller can run
+            the program in a new java process"""
+
+    def _main(jpype):
+        """Call the main method of the class"""
+        jpype.JClass(main_class).main(jpype.JArray(jpype.JString)(args))
+
+    try:
+        run_in_jvm(_main, memory)
+    except ImportError:
+        return False
+    return True
+
+
 def check_cmd_output(command):
     "Run a shell command and return the result as string"
     process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
@@ -108,19 +207,34 @@ def ensure_file_exists(filename):
         import fileinput
         for line in fileinput.FileInput(filename,inplace=0):
             line = line.replace("\\\\","/")
-def is_good_wave(filename):
-    """Check if the wave is in correct format for LIUM.
+def wave_params(filename):
+    """Read the parameters of a wave file by the wave module.
 
     :type filename: string
-    :param filename: file to check"""
+    :param filename: file to read
+
+    :rtype: tuple or None
+    :returns: the same tuple of wave.Wave_read.getparams(), or None if the
+            file is not a wave readable by the wave module (empty, truncated,
+            compressed or in extensible format)"""
     import wave
-    par = None
     try:
-        w_file = wave.open(filename)
-        par = w_file.getparams()
+        w_file = wave.open(filename, 'rb')
+    except (wave.Error, EOFError, struct.error):
+        return None
+    try:
+        return w_file.getparams()
+    finally:
         w_file.close()
-    except wave.Error, exc:
-        print exc
+
+
+def is_good_wave(filename):
+    """Check if the wave is in correct format for LIUM.
+
+    :type filename: string
+    :param filename: file to check"""
+    par = wave_params(filename)
+    if par is None:
         return False
     if par[:3] == (1, 2, 16000) and par[-1:] == ('not compressed',):
         return True
@@ -156,8 +270,9 @@ def humanize_time(secs):
 
     :type secs: integer
     :param secs: the time in seconds to represent in human readable format
-           (hh:mm:ss)"""
+           (hh:mm:ss,mmm)"""
+    msecs = int(round(secs * 1000))
+    secs, msecs = divmod(msecs, 1000)
     mins, secs = divmod(secs, 60)
     hours, mins = divmod(mins, 60)
-    return '%02d:%02d:%02d,%s' % (hours, mins, int(secs), 
-                                  str(("%0.3f" % secs))[-3:])
+    return '%02d:%02d:%02d,%03d' % (hours, mins, secs, msecs)